@@ -0,0 +1,153 @@
+# SSE connection lifecycle for /stream
+# - admission limit on concurrent streams (each one holds a worker thread
+#   while its consumer polls)
+# - drives the sync event generator from a worker thread
+# - watches for the client's disconnect itself, so the generator stops within
+#   one poll, and releases the stream however the response ends
+# - bookkeeping for the /connections report
+
+import asyncio
+import itertools
+import threading
+import time
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+import anyio
+from fastapi.responses import StreamingResponse
+
+
+class StreamConnection:
+    def __init__(self, conn_id: int, client: str, params: Dict[str, Any]):
+        self.id = conn_id
+        self.client = client
+        self.params = params
+        self.opened_at = time.time()
+        self.last_sent_at = time.monotonic()
+        self.events_sent = 0
+        self.bytes_sent = 0
+        # Set when the client is gone; the generator stops at its next poll loop
+        self.closing = threading.Event()
+
+    def note_sent(self, chunk: str):
+        self.last_sent_at = time.monotonic()
+        self.bytes_sent += len(chunk)
+        if not chunk.startswith(":"):
+            self.events_sent += 1
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self.last_sent_at
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "client": self.client,
+            "params": self.params,
+            "opened_at": self.opened_at,
+            "age_sec": round(time.time() - self.opened_at, 3),
+            "idle_sec": round(self.idle_for(), 3),
+            "events_sent": self.events_sent,
+            "bytes_sent": self.bytes_sent,
+        }
+
+
+class ConnectionManager:
+    def __init__(self, max_streams: int):
+        self.max_streams = max(1, max_streams)
+        self.active: Dict[int, StreamConnection] = {}
+        self.total_admitted = 0
+        self.total_rejected = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def admit(self, client: str, params: Dict[str, Any]) -> Optional[StreamConnection]:
+        """Register a new stream, or return None if the limit is reached."""
+        with self._lock:
+            if len(self.active) >= self.max_streams:
+                self.total_rejected += 1
+                return None
+            conn = StreamConnection(next(self._ids), client, params)
+            self.active[conn.id] = conn
+            self.total_admitted += 1
+            return conn
+
+    def release(self, conn: StreamConnection):
+        conn.closing.set()
+        with self._lock:
+            if self.active.pop(conn.id, None) is None:
+                return
+        print(
+            f"[STREAM] closed id={conn.id} client={conn.client} events={conn.events_sent} "
+            f"bytes={conn.bytes_sent} age={time.time() - conn.opened_at:.1f}s"
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            conns: List[StreamConnection] = list(self.active.values())
+            totals = {"admitted": self.total_admitted, "rejected": self.total_rejected}
+        return {
+            "active": len(conns),
+            "max": self.max_streams,
+            **totals,
+            "connections": [c.describe() for c in conns],
+        }
+
+    async def run(self, conn: StreamConnection, gen: Iterator[str]) -> AsyncIterator[str]:
+        """Pull chunks from the sync generator in a worker thread."""
+        pull = partial(next, gen, None)
+        while True:
+            chunk = await anyio.to_thread.run_sync(pull)
+            if chunk is None:
+                return
+            conn.note_sent(chunk)
+            yield chunk
+
+    def response(self, conn: StreamConnection, gen: Iterator[str],
+                 on_close: Optional[Callable[[], None]] = None) -> "StreamResponse":
+        """SSE response for an admitted stream; `on_close` runs once it ends (e.g. consumer.close)."""
+        return StreamResponse(self, conn, gen, on_close)
+
+
+class StreamResponse(StreamingResponse):
+    """
+    StreamingResponse that owns an admitted connection.
+
+    A worker thread blocked in the generator's poll cannot be cancelled, so
+    the disconnect is watched for separately and sets conn.closing while that
+    poll is still running; the generator then returns within one poll. The
+    generator, on_close and release run in __call__'s finally, so they also
+    run when the body is cancelled before it was ever iterated.
+    """
+
+    def __init__(self, manager: ConnectionManager, conn: StreamConnection, gen: Iterator[str],
+                 on_close: Optional[Callable[[], None]] = None):
+        super().__init__(manager.run(conn, gen), media_type="text/event-stream")
+        self.manager = manager
+        self.conn = conn
+        self.gen = gen
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            self.conn.closing.set()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            watcher.cancel()
+            self.conn.closing.set()
+            try:
+                with anyio.CancelScope(shield=True):
+                    await anyio.to_thread.run_sync(self._close)
+            finally:
+                self.manager.release(self.conn)
+
+    def _close(self):
+        try:
+            self.gen.close()
+        finally:
+            if self.on_close is not None:
+                self.on_close()
@@ -0,0 +1,165 @@
+# Shared control state for the PBFT consumer API
+# - holds the run/epoch state that used to live in main.py module globals
+# - also stores the /castest workload spec so every worker serves the same one
+# - backed by SQLite: private in-memory DB by default, or a file shared by
+#   every uvicorn worker when PBFT_STATE_DB is set
+# - streams notice changes by comparing control_epoch on each poll loop
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple
+
+
+class ControlSnapshot(NamedTuple):
+    control_epoch: int
+    current_request: str
+    replica_count: int
+    current_replica_count: int
+    faulty_replicas: FrozenSet[int]
+    workload_version: int
+
+
+def bump_epoch(epoch: int) -> int:
+    return (epoch + 1) if epoch >= 0 else 0
+
+
+class ControlState:
+    """
+    Control state shared by all worker processes.
+
+    Small fields live in one JSON row so a snapshot is a single read and
+    updates are atomic read-modify-write transactions. Event ids are handed
+    out in blocks so the shared store is not touched for every event; ids are
+    unique across workers and increasing within each worker.
+    """
+
+    def __init__(self, path: str | None, replica_count: int, eid_block: int = 256):
+        self.path = path or ":memory:"
+        self.eid_block = max(1, eid_block)
+        self._defaults = {
+            "control_epoch": -1,
+            "current_request": "Empty Request",
+            "replica_count": replica_count,
+            "current_replica_count": replica_count,
+            "faulty_replicas": [],
+            "workload_version": 0,
+        }
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid = 0
+        self._eid_next = 0
+        self._eid_limit = 0
+
+    @property
+    def shared(self) -> bool:
+        return self.path != ":memory:"
+
+    def _connection(self) -> sqlite3.Connection:
+        # Reconnect after fork: SQLite handles must not cross process boundaries.
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+        conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None, check_same_thread=False)
+        if self.shared:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS control (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.executemany(
+            "INSERT OR IGNORE INTO control (key, value) VALUES (?, ?)",
+            [
+                ("state", json.dumps(self._defaults)),
+                ("eid_next", "1"),
+                ("last_round_events", "[]"),
+                ("workload", "null"),
+            ],
+        )
+        self._conn = conn
+        self._pid = os.getpid()
+        self._eid_next = self._eid_limit = 0
+        return conn
+
+    def _get(self, conn: sqlite3.Connection, key: str) -> Any:
+        row = conn.execute("SELECT value FROM control WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put(self, conn: sqlite3.Connection, key: str, value: Any):
+        conn.execute("REPLACE INTO control (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _get_state(self, conn: sqlite3.Connection) -> Dict[str, Any]:
+        # Fill in fields added since the shared file was created
+        return {**self._defaults, **self._get(conn, "state")}
+
+    @staticmethod
+    def _to_snapshot(state: Dict[str, Any]) -> ControlSnapshot:
+        return ControlSnapshot(
+            control_epoch=state["control_epoch"],
+            current_request=state["current_request"],
+            replica_count=state["replica_count"],
+            current_replica_count=state["current_replica_count"],
+            faulty_replicas=frozenset(state["faulty_replicas"]),
+            workload_version=state["workload_version"],
+        )
+
+    def snapshot(self) -> ControlSnapshot:
+        with self._lock:
+            return self._to_snapshot(self._get_state(self._connection()))
+
+    def update(self, mutate: Callable[[Dict[str, Any]], None]) -> ControlSnapshot:
+        """
+        Atomically apply `mutate` to the state dict and return the new snapshot.
+        `faulty_replicas` is passed as a set; set `last_round_events` or
+        `workload` in the dict to also replace the stored round history or
+        workload spec.
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = self._get_state(conn)
+                state["faulty_replicas"] = set(state["faulty_replicas"])
+                mutate(state)
+                history = state.pop("last_round_events", None)
+                workload = state.pop("workload", None)
+                state["faulty_replicas"] = sorted(state["faulty_replicas"])
+                self._put(conn, "state", state)
+                if history is not None:
+                    self._put(conn, "last_round_events", list(history))
+                if workload is not None:
+                    # an empty dict clears the workload
+                    self._put(conn, "workload", workload or None)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return self._to_snapshot(state)
+
+    def last_round_events(self) -> List[str]:
+        with self._lock:
+            return self._get(self._connection(), "last_round_events") or []
+
+    def set_last_round_events(self, lines: List[str]):
+        with self._lock:
+            self._put(self._connection(), "last_round_events", lines)
+
+    def workload(self) -> Dict[str, Any] | None:
+        with self._lock:
+            return self._get(self._connection(), "workload")
+
+    def next_eid(self) -> int:
+        with self._lock:
+            if self._eid_next >= self._eid_limit:
+                conn = self._connection()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    start = self._get(conn, "eid_next")
+                    self._put(conn, "eid_next", start + self.eid_block)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                self._eid_next = start
+                self._eid_limit = start + self.eid_block
+            eid = self._eid_next
+            self._eid_next += 1
+            return eid
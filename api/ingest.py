@@ -0,0 +1,107 @@
+# In-process log source for local runs without Redpanda
+# - /ingest appends raw log records here instead of going through the broker
+# - /stream?source=ingest reads it through a KafkaConsumer-shaped consumer,
+#   so records go through the same parse/assembly pipeline
+# - bounded: offers that would overwrite records an open consumer has not
+#   read yet are refused, which /ingest turns into 429 / Retry-After
+#
+# The log lives in one process; with several uvicorn workers, post to and
+# stream from the same worker (or run a single worker for ingest mode).
+
+import threading
+from collections import namedtuple
+from typing import Dict, List, Tuple
+
+IngestRecord = namedtuple("IngestRecord", ["offset", "value"])
+
+TOPIC_PARTITION = ("ingest", 0)
+
+
+class IngestLog:
+    """
+    Broadcast log: every consumer reads every record from its own offset,
+    like a Kafka consumer with a unique group.
+    """
+
+    def __init__(self, capacity: int, max_poll_records: int):
+        self.capacity = max(1, capacity)
+        self.max_poll_records = max(1, max_poll_records)
+        self.records: List[str] = []
+        self.base_offset = 0
+        self.consumers: "set[IngestConsumer]" = set()
+        self.cond = threading.Condition()
+
+    @property
+    def end_offset(self) -> int:
+        return self.base_offset + len(self.records)
+
+    def _trim(self):
+        overflow = len(self.records) - self.capacity
+        if overflow > 0:
+            del self.records[:overflow]
+            self.base_offset += overflow
+
+    def free_space(self) -> int:
+        """Records that can be offered without overrunning the slowest open consumer."""
+        with self.cond:
+            if not self.consumers:
+                return self.capacity
+            slowest = min(c.position for c in self.consumers)
+            return self.capacity - (self.end_offset - max(slowest, self.base_offset))
+
+    def offer(self, values: List[str]) -> bool:
+        """Append `values` unless that would drop records an open consumer still needs."""
+        with self.cond:
+            if self.consumers:
+                slowest = min(c.position for c in self.consumers)
+                pending = self.end_offset - max(slowest, self.base_offset)
+                if pending + len(values) > self.capacity:
+                    return False
+            self.records.extend(values)
+            self._trim()
+            self.cond.notify_all()
+            return True
+
+    def append(self, values: List[str]):
+        """Append `values`, dropping the oldest records if the log is full."""
+        with self.cond:
+            self.records.extend(values)
+            self._trim()
+            self.cond.notify_all()
+
+    def make_consumer(self, offset: str = "latest") -> "IngestConsumer":
+        consumer = IngestConsumer(self, offset)
+        with self.cond:
+            self.consumers.add(consumer)
+        return consumer
+
+
+class IngestConsumer:
+    """Implements the slice of the KafkaConsumer API that main.stream() uses."""
+
+    def __init__(self, log: IngestLog, offset: str):
+        self.log = log
+        with log.cond:
+            self.position = log.base_offset if offset == "earliest" else log.end_offset
+
+    def poll(self, timeout_ms: int = 0) -> Dict[Tuple[str, int], List[IngestRecord]]:
+        log = self.log
+        with log.cond:
+            if self.position >= log.end_offset:
+                log.cond.wait(timeout_ms / 1000.0)
+            # A reader that fell out of the retained window skips ahead
+            self.position = max(self.position, log.base_offset)
+            start = self.position - log.base_offset
+            values = log.records[start:start + log.max_poll_records]
+            first = self.position
+            self.position += len(values)
+        if not values:
+            return {}
+        return {TOPIC_PARTITION: [IngestRecord(first + i, v) for i, v in enumerate(values)]}
+
+    def assignment(self):
+        return {TOPIC_PARTITION}
+
+    def close(self):
+        with self.log.cond:
+            self.log.consumers.discard(self)
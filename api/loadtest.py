@@ -0,0 +1,293 @@
+# SSE fan-out load test for the PBFT consumer API
+# - runs main:app in a child process with streams reading the in-process ingest log
+# - a traffic generator writes synthetic PBFT rounds into that log
+# - opens N simulated /stream clients (some deliberately slow) and measures
+#   delivered events/s, ingestion-to-client latency, server RSS and thread count
+#
+# Linux only (reads /proc). No Redpanda required.
+#
+#   python loadtest.py --clients 1,10,50,100 --slow-fraction 0.1 --duration 10
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional, Tuple
+
+from ingest import IngestLog
+
+TS_PATTERN = re.compile(rb'"ts": (\d+)')
+
+
+def make_log_record(receiver: str, participant: int, message_name: str, message: Dict[str, Any]) -> str:
+    return json.dumps({
+        "receiver": receiver,
+        "data": {
+            "log-name": "log_message_event",
+            "log-timestamp": int(time.time() * 1_000_000),
+            "log-data": {
+                "instance": 0,
+                "message-name": message_name,
+                "connection": {"participant": participant},
+                "message": message,
+                "signature": "0x" + "AB" * 64,
+            },
+        },
+    })
+
+
+def generate_traffic(log: IngestLog, replicas: int, rate: float, stop: threading.Event):
+    """
+    Write full PBFT rounds (request, preprepare, prepare, commit, inform)
+    into `log` at roughly `rate` events per second. Records are appended
+    without backpressure, so clients that fall too far behind lose records.
+    """
+    interval = 1.0 / rate if rate > 0 else 0.0
+    next_at = time.time()
+    rank = 0
+    while not stop.is_set():
+        rank += 1
+        order = rank
+        digest = f"{rank:064x}"
+        proposal = {"message": {"order": order, "view": 0, "digest": digest}}
+        round_records: List[Tuple[str, int, str, Dict[str, Any]]] = [
+            ("replica-1", 0, "request", {"cid": 1, "rank": rank, "payload": str(rank)}),
+        ]
+        for r in range(1, replicas):
+            round_records.append((f"replica-{r + 1}", 0, "preprepare", {
+                "proposal": proposal,
+                "client_request": {"message": {"cid": 1, "rank": rank}},
+            }))
+        for phase in ("prepare", "commit"):
+            for sender in range(replicas):
+                for r in range(replicas):
+                    if r != sender:
+                        round_records.append((f"replica-{r + 1}", sender, phase, {"proposal": proposal}))
+        for sender in range(replicas):
+            round_records.append(("client-1", sender, "inform", {
+                "order": order, "current_view": 0, "rank": rank,
+            }))
+
+        for receiver, participant, name, message in round_records:
+            if stop.is_set():
+                return
+            next_at += interval
+            delay = next_at - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            log.append([make_log_record(receiver, participant, name, message)])
+
+
+def serve(args: argparse.Namespace):
+    os.environ.setdefault("PBFT_DEBUG_BUFFERS", "0")
+    os.environ.setdefault("PBFT_REPLICAS", str(args.replicas))
+    os.environ["PBFT_SOURCE"] = "ingest"
+    os.environ["PBFT_INGEST_CAPACITY"] = str(args.retain)
+    if args.max_streams:
+        os.environ["PBFT_MAX_STREAMS"] = str(args.max_streams)
+    import uvicorn
+    import main
+
+    stop = threading.Event()
+    gen = threading.Thread(
+        target=generate_traffic,
+        args=(main.ingest_log, args.replicas, args.rate, stop),
+        name="traffic-generator",
+        daemon=True,
+    )
+    gen.start()
+    try:
+        uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+    finally:
+        stop.set()
+
+
+def proc_status(pid: int) -> Tuple[int, int]:
+    """Return (RSS in KiB, thread count) for `pid`."""
+    rss_kb = threads = 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss_kb = int(line.split()[1])
+            elif line.startswith("Threads:"):
+                threads = int(line.split()[1])
+    return rss_kb, threads
+
+
+class ClientStats:
+    def __init__(self, slow: bool):
+        self.slow = slow
+        self.events = 0
+        self.latencies_us: List[int] = []
+        self.error: Optional[str] = None
+
+
+async def sse_client(port: int, idx: int, stats: ClientStats, slow_delay: float):
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=1 << 20)
+    except OSError as e:
+        stats.error = repr(e)
+        return
+    try:
+        writer.write(
+            f"GET /stream?group=loadtest-{idx}-{time.time_ns()} HTTP/1.1\r\n"
+            f"Host: 127.0.0.1:{port}\r\nAccept: text/event-stream\r\n\r\n".encode()
+        )
+        await writer.drain()
+        status = await reader.readline()
+        if b" 200 " not in status:
+            stats.error = status.decode(errors="replace").strip()
+            return
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if not line.startswith(b"data: "):
+                continue
+            m = TS_PATTERN.search(line)
+            if m:
+                stats.latencies_us.append(int(time.time() * 1_000_000) - int(m.group(1)))
+            stats.events += 1
+            if stats.slow:
+                await asyncio.sleep(slow_delay)
+    except asyncio.CancelledError:
+        pass
+    except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+        stats.error = repr(e)
+    finally:
+        writer.close()
+
+
+def percentile(values: List[int], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(pct / 100.0 * (len(values) - 1)))))
+    return values[k] / 1000.0
+
+
+async def run_step(port: int, server_pid: int, clients: int, slow_fraction: float,
+                   slow_delay: float, duration: float) -> Dict[str, Any]:
+    slow_count = int(round(clients * slow_fraction))
+    stats = [ClientStats(slow=i < slow_count) for i in range(clients)]
+    tasks = [asyncio.create_task(sse_client(port, i, s, slow_delay)) for i, s in enumerate(stats)]
+
+    peak_rss_kb = peak_threads = 0
+    started = time.time()
+    while time.time() - started < duration:
+        await asyncio.sleep(0.5)
+        rss_kb, threads = proc_status(server_pid)
+        peak_rss_kb = max(peak_rss_kb, rss_kb)
+        peak_threads = max(peak_threads, threads)
+    elapsed = time.time() - started
+
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    fast_lat = [v for s in stats if not s.slow for v in s.latencies_us]
+    slow_lat = [v for s in stats if s.slow for v in s.latencies_us]
+    return {
+        "clients": clients,
+        "slow_clients": slow_count,
+        "events": sum(s.events for s in stats),
+        "events_per_sec": sum(s.events for s in stats) / elapsed,
+        "p50_ms": percentile(fast_lat, 50),
+        "p99_ms": percentile(fast_lat, 99),
+        "slow_p99_ms": percentile(slow_lat, 99),
+        "rss_mb": peak_rss_kb / 1024.0,
+        "threads": peak_threads,
+        "errors": sum(1 for s in stats if s.error),
+    }
+
+
+def wait_until_healthy(port: int, timeout: float = 15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as resp:
+                if resp.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"API did not become healthy on port {port}")
+
+
+def fmt(value: Optional[float], spec: str = ".1f") -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def drive(args: argparse.Namespace):
+    steps = [int(n) for n in args.clients.split(",") if n.strip()]
+    cmd = [
+        sys.executable, os.path.abspath(__file__), "--serve",
+        "--port", str(args.port),
+        "--rate", str(args.rate),
+        "--replicas", str(args.replicas),
+        "--retain", str(args.retain),
+        "--max-streams", str(args.max_streams or max(steps, default=1)),
+    ]
+    server_log = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+    server = subprocess.Popen(cmd, stdout=server_log, stderr=subprocess.STDOUT)
+    results: List[Dict[str, Any]] = []
+    try:
+        wait_until_healthy(args.port)
+        print(f">> API pid={server.pid} rate={args.rate}/s replicas={args.replicas}")
+        print(f"{'clients':>8} {'slow':>5} {'events/s':>10} {'p50 ms':>8} {'p99 ms':>8} "
+              f"{'slow p99':>9} {'rss MB':>7} {'threads':>8} {'errors':>7}")
+        for n in steps:
+            res = asyncio.run(run_step(
+                args.port, server.pid, n, args.slow_fraction, args.slow_delay, args.duration,
+            ))
+            results.append(res)
+            print(f"{res['clients']:>8} {res['slow_clients']:>5} {res['events_per_sec']:>10.1f} "
+                  f"{fmt(res['p50_ms']):>8} {fmt(res['p99_ms']):>8} {fmt(res['slow_p99_ms']):>9} "
+                  f"{res['rss_mb']:>7.1f} {res['threads']:>8} {res['errors']:>7}")
+            # let the server notice the closed streams before the next step
+            time.sleep(args.settle)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        if args.server_log:
+            server_log.close()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f">> Wrote {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE fan-out load test for the PBFT consumer API")
+    parser.add_argument("--clients", default="1,10,50,100", help="comma separated client counts to step through")
+    parser.add_argument("--slow-fraction", type=float, default=0.1, help="fraction of clients that read slowly")
+    parser.add_argument("--slow-delay", type=float, default=0.05, help="seconds a slow client sleeps per event")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to measure at each step")
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds to wait between steps")
+    parser.add_argument("--rate", type=float, default=200.0, help="generated events per second")
+    parser.add_argument("--replicas", type=int, default=4)
+    parser.add_argument("--retain", type=int, default=100_000, help="records kept in the ingest log")
+    parser.add_argument("--max-streams", type=int, default=0, help="API stream limit (default: largest client count)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="also write results to this file")
+    parser.add_argument("--server-log", help="write the API's stdout/stderr to this file")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+    else:
+        drive(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,18 +4,28 @@
 # - filters for PBFT protocol messages
 # - streams them to the browser via Server-Sent Events (SSE)
 
+import asyncio
 import json
+import math
 import os
 import time
 import subprocess
-from typing import Any, Dict, List, Optional, Set, Tuple
+import zlib
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
 from collections import Counter
 
-from fastapi import FastAPI, Form
+from fastapi import FastAPI, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from kafka import KafkaConsumer
 
+from connections import ConnectionManager
+from ingest import IngestLog
+from stream_filter import FilterError, FilterSpec, compile_filter
+from control_state import ControlSnapshot, ControlState, bump_epoch
+from vote_detector import DETECTOR_EVENT_TYPES, DetectorEvent, VoteDetector
+from workload import Workload, WorkloadError
+
 
 def compute_fault_tolerance(replica_count: int) -> int:
     if not isinstance(replica_count, int) or replica_count < 1:
@@ -44,6 +54,11 @@ if _fault_from_env is not None:
 else:
     FAULT_TOLERANCE = compute_fault_tolerance(REPLICA_COUNT)
     FAULT_TOLERANCE_FROM_ENV = False
+
+
+def effective_fault_tolerance(replica_count: int) -> int:
+    return FAULT_TOLERANCE if FAULT_TOLERANCE_FROM_ENV else compute_fault_tolerance(replica_count)
+
 SESSION_ID = os.getenv("PBFT_SESSION_ID", "pbft-session")
 ALLOWED_ORIGINS = [origin.strip() for origin in os.getenv("PBFT_ALLOWED_ORIGINS", "*").split(",") if origin.strip()]
 SCHEMA_VERSION = 1
@@ -68,15 +83,40 @@ REQUEST_FLUSH_AFTER_SEC = float(os.getenv("PBFT_REQUEST_FLUSH_SEC", "12.0"))
 MAX_REQUEST_BUFFERS = int(os.getenv("PBFT_MAX_INFLIGHT_REQUESTS", "64"))
 # Default ON; set PBFT_DEBUG_BUFFERS=0 to disable
 DEBUG_BUFFERS = os.getenv("PBFT_DEBUG_BUFFERS", "1") != "0"
+# Set to a file path to share control state between uvicorn workers
+STATE_DB = os.getenv("PBFT_STATE_DB") or None
+EID_BLOCK = int(os.getenv("PBFT_EID_BLOCK", "256"))
+# Quorum / missing vote / equivocation detection; set PBFT_DETECT_VOTES=0 to disable
+DETECT_VOTES = os.getenv("PBFT_DETECT_VOTES", "1") != "0"
+VOTE_DEADLINE_SEC = float(os.getenv("PBFT_VOTE_DEADLINE_SEC", "3.0"))
+VOTE_WINDOW = int(os.getenv("PBFT_VOTE_WINDOW", "512"))
+# /castest workload limits
+WORKLOAD_MAX_BATCH = int(os.getenv("PBFT_WORKLOAD_MAX_BATCH", "1000"))
+WORKLOAD_MAX_WAIT_SEC = float(os.getenv("PBFT_WORKLOAD_MAX_WAIT_SEC", "5.0"))
+# Where /stream reads records from by default: "kafka" or "ingest" (POST /ingest, no broker)
+STREAM_SOURCE = os.getenv("PBFT_SOURCE", "kafka").strip().lower()
+INGEST_CAPACITY = int(os.getenv("PBFT_INGEST_CAPACITY", "50000"))
+INGEST_MAX_WAIT_SEC = float(os.getenv("PBFT_INGEST_MAX_WAIT_SEC", "2.0"))
+INGEST_MAX_LINE_BYTES = int(os.getenv("PBFT_INGEST_MAX_LINE_BYTES", str(1 << 20)))
+# Each open stream holds a worker thread (the default pool has 40), so keep
+# the limit below that to leave room for the other endpoints
+MAX_STREAMS = int(os.getenv("PBFT_MAX_STREAMS", "32"))
+HEARTBEAT_SEC = float(os.getenv("PBFT_HEARTBEAT_SEC", "15.0"))
 
-_last_eid_assigned = 0
-
-current_request = "Empty Request"
 current_request_id = 0
-current_replica_count = REPLICA_COUNT
-control_epoch = -1
-last_round_events: List[str] = []
-faulty_replicas: Set[int] = set()
+
+# control_epoch, current_request, replica counts, faulty replicas,
+# last round history and eid allocation
+control = ControlState(STATE_DB, REPLICA_COUNT, eid_block=EID_BLOCK)
+
+connections = ConnectionManager(MAX_STREAMS)
+
+# Records posted to /ingest, read by streams with source=ingest
+ingest_log = IngestLog(INGEST_CAPACITY, MAX_POLL_RECORDS)
+
+# This worker's copy of the shared workload spec, rebuilt when its version changes
+_workload: Optional[Workload] = None
+_workload_version = 0
 
 app = FastAPI(title="PBFT Consumer API")
 app.add_middleware(
@@ -189,7 +229,7 @@ def extract_message_index(data: Dict[str, Any]) -> Optional[int]:
     return idx if isinstance(idx, int) else None
 
 
-def parse_receiver_id(outer: Dict[str, Any]) -> Optional[int]:
+def parse_receiver_id(outer: Dict[str, Any], replica_count: int) -> Optional[int]:
     name = outer.get("receiver")
     if not isinstance(name, str):
         return None
@@ -202,7 +242,7 @@ def parse_receiver_id(outer: Dict[str, Any]) -> Optional[int]:
     if name.startswith("client-"):
         try:
             val = int(name.split("client-")[-1])
-            return current_replica_count + max(0, val - 1)
+            return replica_count + max(0, val - 1)
         except ValueError:
             return None
     return None
@@ -274,12 +314,74 @@ def describe_buffers(buffers: Dict[str, RequestBuffer], active_key: Optional[str
     return f"active={active_key} keys=[{joined}]"
 
 
-def filter_pbft_event(raw_value: str) -> Dict[str, Any] | None:
+class RawJSON:
+    """
+    A JSON value kept as a span of the Kafka record it was read from.
+    The text is spliced into SSE frames verbatim instead of being re-encoded.
+    """
+
+    __slots__ = ("source", "start", "end")
+
+    def __init__(self, source: str, start: int, end: int):
+        self.source = source
+        self.start = start
+        self.end = end
+
+    def __str__(self) -> str:
+        text = self.source[self.start:self.end]
+        # Raw newlines can only be insignificant whitespace in valid JSON, and
+        # they would split the SSE data line, so blank them out.
+        if "\n" in text or "\r" in text:
+            text = text.replace("\r", " ").replace("\n", " ")
+        return text
+
+
+_JSON_DECODER = json.JSONDecoder()
+_LOG_DATA_KEY = '"log-data":'
+# Below this size re-encoding log-data is about as cheap as locating it
+SPLICE_MIN_BYTES = 1024
+
+
+def _decode_with_log_data_span(raw_value: str) -> Tuple[Any, Optional[Tuple[int, int]]]:
+    """
+    json.loads `raw_value` and report the (start, end) span of data.log-data
+    (None for records under SPLICE_MIN_BYTES).
+
+    The key is located with str.find and its value decoded on its own; the
+    rest of the record is then decoded with that value replaced by null, so
+    each byte goes through the C decoder once. Any other layout (spaced or
+    repeated key, escaped quote, key not under "data") falls back to a plain
+    json.loads with no span.
+    """
+    if len(raw_value) < SPLICE_MIN_BYTES:
+        return json.loads(raw_value), None
+    key = raw_value.find(_LOG_DATA_KEY)
+    if key <= 0 or raw_value[key - 1] == "\\" or raw_value.find(_LOG_DATA_KEY, key + 1) != -1:
+        return json.loads(raw_value), None
+    start = key + len(_LOG_DATA_KEY)
+    if raw_value[start:start + 1] == " ":
+        start += 1
+    if raw_value[start:start + 1] != "{":
+        return json.loads(raw_value), None
     try:
-        obj = json.loads(raw_value)
+        data, end = _JSON_DECODER.scan_once(raw_value, start)
+    except StopIteration:
+        return json.loads(raw_value), None
+    obj = json.loads(raw_value[:start] + "null" + raw_value[end:])
+    outer = obj.get("data") if isinstance(obj, dict) else None
+    if not isinstance(outer, dict) or outer.get("log-data", 0) is not None:
+        return json.loads(raw_value), None
+    outer["log-data"] = data
+    return obj, (start, end)
+
+
+def filter_pbft_event(raw_value: str, replica_count: Optional[int] = None) -> Dict[str, Any] | None:
+    # Decode the record once, remembering where log-data sits in the original
+    # text so the envelope can splice it back in without a json.dumps round trip.
+    try:
+        obj, data_span = _decode_with_log_data_span(raw_value)
     except json.JSONDecodeError:
         return None
-
     if not isinstance(obj, dict):
         return None
 
@@ -303,7 +405,9 @@ def filter_pbft_event(raw_value: str) -> Dict[str, Any] | None:
     rank = extract_request_counter(data)
     message_index = extract_message_index(data)
     seq_val = extract_order(data)
-    receiver_id = parse_receiver_id(obj)
+    if replica_count is None:
+        replica_count = control.snapshot().current_replica_count
+    receiver_id = parse_receiver_id(obj, replica_count)
 
     cleaned = {
         "log_name": outer.get("log-name"),
@@ -319,6 +423,7 @@ def filter_pbft_event(raw_value: str) -> Dict[str, Any] | None:
         "message_index": message_index,
         "receiver_id": receiver_id,
         "raw": data,
+        "raw_json": RawJSON(raw_value, *data_span) if data_span else None,
     }
     return cleaned
 
@@ -386,16 +491,20 @@ def build_envelope(cleaned: Dict[str, Any]) -> Dict[str, Any] | None:
         "seq": seq_val,
         "from": from_id,
         "to": to_field,
-        "data": cleaned.get("raw"),
+        "data": cleaned.get("raw_json") or cleaned.get("raw"),
     }
     return envelope
 
 
 def stamp_and_format_event(event: Dict[str, Any]) -> str:
-    global _last_eid_assigned
-    _last_eid_assigned += 1
-    event["eid"] = _last_eid_assigned
-    payload = json.dumps(event)
+    event["eid"] = control.next_eid()
+    data = event.get("data")
+    if isinstance(data, RawJSON):
+        # Serialize only the small header and splice the original log-data text in.
+        header = {k: v for k, v in event.items() if k != "data"}
+        payload = f'{json.dumps(header)[:-1]}, "data": {data}}}'
+    else:
+        payload = json.dumps(event)
     return f"id: {event['eid']}\ndata: {payload}\n\n"
 
 
@@ -414,37 +523,140 @@ def build_control_event(event_type: str, data: Dict[str, Any]) -> Dict[str, Any]
     }
 
 
+# Always sent, whatever the subscription filter, so viewers can set up the session
+SESSION_CONTROL_TYPES = {"SessionStart", "PrimaryElected", "FaultyReplicas"}
+# Lower-cased names a /stream `types` filter may ask for
+STREAM_EVENT_TYPES = frozenset(
+    t.lower() for t in (*MESSAGE_TYPE_MAP.values(), *SESSION_CONTROL_TYPES, *DETECTOR_EVENT_TYPES)
+)
+
+
+def parse_sse_event(line: str) -> Dict[str, Any] | None:
+    # Recover the envelope from an already formatted "id: ..\ndata: ..\n\n" frame
+    _, sep, payload = line.partition("data: ")
+    if not sep:
+        return None
+    try:
+        return json.loads(payload)
+    except json.JSONDecodeError:
+        return None
+
+
+def build_detector_event(det: DetectorEvent) -> Dict[str, Any]:
+    event = build_control_event(det.type, det.data)
+    event["view"] = det.view
+    event["seq"] = det.seq
+    event["from"] = det.sender
+    return event
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+@app.get("/connections")
+def list_connections():
+    return connections.describe()
+
+
 @app.get("/stream")
-def stream(offset: str = "latest", from_eid: int | None = None, group: str | None = None):
+def stream(
+    request: Request,
+    offset: str = "latest",
+    from_eid: int | None = None,
+    group: str | None = None,
+    source: str | None = None,
+    types: str | None = None,
+    from_ids: str | None = None,
+    to_ids: str | None = None,
+    seq_min: int | None = None,
+    seq_max: int | None = None,
+    view_min: int | None = None,
+    view_max: int | None = None,
+    only_faulty: bool = False,
+):
+    """
+    SSE stream of PBFT envelopes. Optional filters (all must match):
+    types (comma list), from_ids / to_ids (replica ids, comma list),
+    seq_min/seq_max, view_min/view_max, only_faulty (sender or a receiver
+    is a faulty replica). SessionStart / PrimaryElected / FaultyReplicas
+    are always sent. Idle streams get a ": keepalive" comment every
+    PBFT_HEARTBEAT_SEC; past PBFT_MAX_STREAMS new streams get 503.
+    """
     if isinstance(group, str):
         sanitized_group = group.strip() or None
     else:
         sanitized_group = None
     effective_group = sanitized_group or KAFKA_GROUP_ID
-    print(f"[STREAM] offset={offset}, group={effective_group}")
-    consumer = make_consumer(offset=offset, group_id=effective_group)
+    effective_source = (source or STREAM_SOURCE).strip().lower()
+    try:
+        filter_spec = FilterSpec.build(
+            types=types,
+            from_ids=_parse_ids(from_ids) if from_ids else None,
+            to_ids=_parse_ids(to_ids) if to_ids else None,
+            seq_min=seq_min,
+            seq_max=seq_max,
+            view_min=view_min,
+            view_max=view_max,
+            only_faulty=only_faulty,
+            known_types=STREAM_EVENT_TYPES,
+        )
+    except FilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    accept = compile_filter(filter_spec) if filter_spec else None
+    # Faulty set the only_faulty filter checks against; refreshed every poll loop
+    faulty_now: FrozenSet[int] = frozenset()
+
+    client = f"{request.client.host}:{request.client.port}" if request.client else "unknown"
+    conn = connections.admit(client, {
+        "offset": offset,
+        "group": effective_group,
+        "source": effective_source,
+        "filter": filter_spec._asdict() if filter_spec else None,
+    })
+    if conn is None:
+        print(f"[STREAM] rejected client={client}: {MAX_STREAMS} streams already open")
+        return JSONResponse(
+            {"status": "busy", "detail": f"too many open streams (max {MAX_STREAMS})"},
+            status_code=503,
+            headers={"Retry-After": "5"},
+        )
+
+    print(
+        f"[STREAM] id={conn.id} offset={offset}, group={effective_group}, "
+        f"source={effective_source}, filter={filter_spec}"
+    )
+    try:
+        if effective_source == "ingest":
+            consumer = ingest_log.make_consumer(offset=offset)
+        else:
+            consumer = make_consumer(offset=offset, group_id=effective_group)
+    except BaseException:
+        connections.release(conn)
+        raise
     buffers: Dict[str, RequestBuffer] = {}
 
-    def control_events() -> List[Dict[str, Any]]:
-        effective_f = FAULT_TOLERANCE if FAULT_TOLERANCE_FROM_ENV else compute_fault_tolerance(current_replica_count)
+    def control_events(snap: ControlSnapshot) -> List[Dict[str, Any]]:
+        n = snap.current_replica_count
+        faulty = snap.faulty_replicas
+        effective_f = effective_fault_tolerance(n)
         return [
             # In live mode: f = actual faulty count, f_cap = tolerance
             build_control_event(
                 "SessionStart",
-                {"n": current_replica_count, "f": len(faulty_replicas), "f_cap": effective_f},
+                {"n": n, "f": len(faulty), "f_cap": effective_f},
             ),
             build_control_event("PrimaryElected", {"primary": 0}),
             build_control_event(
                 "FaultyReplicas",
-                {"ids": sorted(faulty_replicas), "count": len(faulty_replicas)},
+                {"ids": sorted(faulty), "count": len(faulty)},
             ),
         ]
 
+    def wanted(ev: Dict[str, Any]) -> bool:
+        return accept is None or ev.get("type") in SESSION_CONTROL_TYPES or accept(ev, faulty_now)
+
     def flush_buffer(key: str, buf: RequestBuffer, remember: bool = True, reason: str = "manual"):
         ordered = buf.drain_sorted()
         if not ordered:
@@ -456,6 +668,8 @@ def stream(offset: str = "latest", from_eid: int | None = None, group: str | Non
         lines: List[str] = []
         eid_values: List[int] = []
         for ev in ordered:
+            if not wanted(ev):
+                continue
             line = stamp_and_format_event(ev)
             lines.append(line)
             eid_val = ev.get("eid")
@@ -463,17 +677,18 @@ def stream(offset: str = "latest", from_eid: int | None = None, group: str | Non
                 eid_values.append(eid_val)
         eid_span = (min(eid_values), max(eid_values)) if eid_values else (None, None)
         print(
-            f"[FLUSH] reason={reason} key={key} total={len(ordered)} phases={phase_detail} "
+            f"[FLUSH] reason={reason} key={key} total={len(ordered)} sent={len(lines)} phases={phase_detail} "
             f"seqs={seqs} senders={senders} eid_span={eid_span}"
         )
         for line in lines:
             yield line
-        if remember:
-            last_round_events.clear()
-            last_round_events.extend(lines)
+        # Only unfiltered streams record the round history others replay
+        if remember and accept is None:
+            control.set_last_round_events(lines)
         buffers.pop(key, None)
 
     def event_generator():
+        nonlocal faulty_now
         try:
             seen_assignment = False
             # For Prepare & Commit messages, we only see order. So we need to map order <-> rank.
@@ -487,20 +702,36 @@ def stream(offset: str = "latest", from_eid: int | None = None, group: str | Non
             last_sent_epoch = -1
 
             # Send initial control and latest round history
-            if control_epoch >= 0 and control_epoch != last_sent_epoch:
-                for ctrl in control_events():
+            snap = control.snapshot()
+            faulty_now = snap.faulty_replicas
+            detector: Optional[VoteDetector] = None
+            if DETECT_VOTES:
+                detector = VoteDetector(
+                    snap.current_replica_count,
+                    effective_fault_tolerance(snap.current_replica_count),
+                    VOTE_DEADLINE_SEC,
+                    VOTE_WINDOW,
+                    snap.faulty_replicas,
+                )
+            if snap.control_epoch >= 0 and snap.control_epoch != last_sent_epoch:
+                for ctrl in control_events(snap):
                     yield stamp_and_format_event(ctrl)
-                last_sent_epoch = control_epoch
-            if last_round_events:
-                for line in last_round_events:
-                    yield line
-
-            while True:
-                # 1. Send control events if new epoch started
-                if control_epoch >= 0 and control_epoch != last_sent_epoch:
-                    for ctrl in control_events():
+                last_sent_epoch = snap.control_epoch
+            for line in control.last_round_events():
+                if accept is not None:
+                    ev = parse_sse_event(line)
+                    if ev is None or not wanted(ev):
+                        continue
+                yield line
+
+            while not conn.closing.is_set():
+                # 1. Send control events if new epoch started (possibly by another worker)
+                snap = control.snapshot()
+                faulty_now = snap.faulty_replicas
+                if snap.control_epoch >= 0 and snap.control_epoch != last_sent_epoch:
+                    for ctrl in control_events(snap):
                         yield stamp_and_format_event(ctrl)
-                    last_sent_epoch = control_epoch
+                    last_sent_epoch = snap.control_epoch
                     # Reset state for a new session/run
                     for k, buf in list(buffers.items()):
                         yield from flush_buffer(k, buf, remember=False)
@@ -509,6 +740,9 @@ def stream(offset: str = "latest", from_eid: int | None = None, group: str | Non
                     rank_to_order.clear()
                     last_order_seen = None
                     last_rank_seen = None
+                    if detector:
+                        n = snap.current_replica_count
+                        detector.reset(n, effective_fault_tolerance(n), snap.faulty_replicas)
 
                 # 2. Pull messages from Kafka
                 polled = consumer.poll(timeout_ms=500)
@@ -540,7 +774,7 @@ def stream(offset: str = "latest", from_eid: int | None = None, group: str | Non
                 for records in polled.values():
                     for msg in records:
                         raw_value = msg.value
-                        cleaned = filter_pbft_event(raw_value) # filter & clean
+                        cleaned = filter_pbft_event(raw_value, snap.current_replica_count) # filter & clean
                         if not cleaned:
                             continue
 
@@ -551,6 +785,20 @@ def stream(offset: str = "latest", from_eid: int | None = None, group: str | Non
                         event_type = envelope.get("type") #'ClientRequest' / 'PrePrepare' / 'Prepare' / 'Commit' / 'Reply'
                         phase_rank = PHASE_ORDER.get(event_type) # 0..4
 
+                        # Vote checks run live, ahead of round buffering
+                        if detector:
+                            for det in detector.observe(
+                                event_type,
+                                envelope["view"],
+                                envelope.get("seq"),
+                                envelope.get("from"),
+                                extract_digest(cleaned["raw"]),
+                                time.time(),
+                            ):
+                                det_event = build_detector_event(det)
+                                if wanted(det_event):
+                                    yield stamp_and_format_event(det_event)
+
                         order_val = cleaned.get("seq")
                         rank_val = cleaned.get("rank")
                         req_key: Optional[str] = None
@@ -618,7 +866,8 @@ def stream(offset: str = "latest", from_eid: int | None = None, group: str | Non
 
                         # bypass unknown types
                         if phase_rank is None:
-                            yield stamp_and_format_event(envelope)
+                            if wanted(envelope):
+                                yield stamp_and_format_event(envelope)
                             continue
 
                         # limit # of active buffers
@@ -642,30 +891,212 @@ def stream(offset: str = "latest", from_eid: int | None = None, group: str | Non
 
                 # Flush stale buffers to ensure single-round outputs still emit
                 now_ts = time.time()
+                if detector:
+                    for det in detector.expire(now_ts):
+                        det_event = build_detector_event(det)
+                        if wanted(det_event):
+                            yield stamp_and_format_event(det_event)
                 for key, buf in list(buffers.items()):
                     if buf.should_flush(now_ts):
                         if active_final_key == key:
                             active_final_key = None
                         yield from flush_buffer(key, buf, reason="idle_timeout")
 
+                # Keep idle connections alive; a failed write also surfaces a dead client
+                if conn.idle_for() >= HEARTBEAT_SEC:
+                    yield ": keepalive\n\n"
+
         finally:
-            # flush all before close
-            for k, buf in list(buffers.items()):
-                yield from flush_buffer(k, buf)
-            consumer.close()
+            # The client is gone (or going) and a closing generator must not
+            # yield. Partial rounds are logged but never become the round
+            # history; filtered streams just drop them.
+            if accept is None:
+                for k, buf in list(buffers.items()):
+                    for _ in flush_buffer(k, buf, remember=False, reason="closed"):
+                        pass
+            buffers.clear()
+
+    # The response closes the generator, then the consumer, however it ends
+    return connections.response(conn, event_generator(), on_close=consumer.close)
+
+def _ingest_value(line: bytes, receiver: str | None) -> str | None:
+    text = line.decode("utf-8", errors="ignore").strip()
+    if not text:
+        return None
+    if receiver:
+        # Bare PBFT log line: wrap it the way wandlr lr does before publishing
+        return f'{{"receiver": {json.dumps(receiver)}, "data": {text}}}'
+    return text
+
+
+async def _offer_ingest(values: List[str]) -> int:
+    """Append `values` in steps; returns how many went in (all, unless the wait ran out)."""
+    # Wait a little for slow streams to catch up before refusing the rest
+    deadline = time.monotonic() + INGEST_MAX_WAIT_SEC
+    step = max(1, ingest_log.capacity // 2)
+    for i in range(0, len(values), step):
+        part = values[i:i + step]
+        while not ingest_log.offer(part):
+            if time.monotonic() >= deadline:
+                return i
+            await asyncio.sleep(0.05)
+    return len(values)
+
+
+@app.post("/ingest")
+async def ingest(request: Request, receiver: str | None = None):
+    """
+    Feed raw log records straight to source=ingest streams, without Kafka.
+    Body: NDJSON, optionally chunked and/or Content-Encoding: gzip. Each line
+    is a record as wandlr publishes it ({"receiver": ..., "data": ...}); with
+    ?receiver=replica-1 lines are bare PBFT log lines and get wrapped.
+    Returns 429 with Retry-After if streams cannot keep up, and 400 for a
+    truncated gzip body or a line over PBFT_INGEST_MAX_LINE_BYTES; `accepted`
+    counts the lines taken before that.
+    """
+    encoding = request.headers.get("content-encoding", "").lower()
+    decomp = zlib.decompressobj(16 + zlib.MAX_WBITS) if "gzip" in encoding else None
+    receiver = (receiver or "").strip() or None
+    pending = b""
+    accepted = 0
+
+    async def take(lines: List[bytes]) -> bool:
+        nonlocal accepted
+        values = [v for v in (_ingest_value(line, receiver) for line in lines) if v]
+        appended = await _offer_ingest(values) if values else 0
+        accepted += appended
+        return appended == len(values)
+
+    try:
+        async for chunk in request.stream():
+            if decomp:
+                chunk = decomp.decompress(chunk)
+            *lines, pending = (pending + chunk).split(b"\n")
+            if not await take(lines):
+                break
+            if len(pending) > INGEST_MAX_LINE_BYTES:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"line longer than {INGEST_MAX_LINE_BYTES} bytes (accepted={accepted})",
+                )
+        else:
+            if decomp:
+                pending += decomp.flush()
+                if not decomp.eof:
+                    raise HTTPException(status_code=400, detail=f"truncated gzip body (accepted={accepted})")
+            if await take(pending.split(b"\n")):
+                return {"status": "ok", "accepted": accepted}
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"bad gzip body: {e} (accepted={accepted})")
+
+    return JSONResponse(
+        {"status": "busy", "accepted": accepted},
+        status_code=429,
+        headers={"Retry-After": str(max(1, math.ceil(INGEST_MAX_WAIT_SEC)))},
+    )
+
+
+def current_workload(snap: ControlSnapshot) -> Optional[Workload]:
+    global _workload, _workload_version
+    if snap.workload_version != _workload_version:
+        spec = control.workload()
+        _workload = Workload.from_spec(spec, WORKLOAD_MAX_BATCH) if spec else None
+        _workload_version = snap.workload_version
+    return _workload
+
+
+def _parse_int(value: str, default: Optional[int]) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 @app.post("/castest")
 async def castest(
     client_id: str = Form(""),
     next_rank: str = Form(""),
+    batch: str = Form(""),
 ):
     """
     Replacement for the old castest.php endpoint.
     Wandlr workload mode will POST here with client_id and next_rank.
+    Without a workload (see /workload) every call gets the current request.
+    With one, each client gets its own stream, `batch` payloads per call
+    (newline separated), paced by the per-client rate limit.
+    """
+    snap = control.snapshot()
+    workload = current_workload(snap)
+    if workload is None:
+        return PlainTextResponse(snap.current_request)
+
+    cid = _parse_int(client_id, 0)
+    rank = _parse_int(next_rank, 0)
+    size = workload.batch_size(_parse_int(batch, None))
+
+    granted, wait = workload.reserve(cid, size, time.monotonic(), WORKLOAD_MAX_WAIT_SEC)
+    if not granted:
+        return PlainTextResponse(
+            "rate limited",
+            status_code=429,
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+    if wait > 0:
+        await asyncio.sleep(wait)
+    return PlainTextResponse("\n".join(workload.take(cid, rank, size, snap.current_request)))
+
+
+@app.post("/workload")
+async def set_workload(
+    template: str = Form(""),
+    payloads: str = Form(""),
+    rate: float = Form(0.0),
+    burst: float = Form(0.0),
+    batch: int = Form(1),
+    action: str = Form("set"),
+):
+    """
+    Configure the per-client request streams served by /castest.
+    action in {set, clear}
+    - payloads: JSON list shared by all clients, or {"<client_id>": [...]}
+    - template: for clients without payloads, e.g. "{message}-c{cid}-r{rank}"
+    - rate / burst: per-client requests per second (0 = unlimited)
+    - batch: payloads per /castest response
     """
-    return PlainTextResponse(current_request)
+    if (action or "").strip().lower() == "clear":
+        def clear(state: Dict[str, Any]):
+            state["workload"] = {}
+            state["workload_version"] += 1
+
+        control.update(clear)
+        return {"status": "cleared"}
+
+    try:
+        parsed = json.loads(payloads) if payloads.strip() else None
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"payloads is not valid JSON: {e}")
+    try:
+        workload = Workload.from_spec(
+            {"template": template.strip(), "payloads": parsed, "rate": rate, "burst": burst, "batch": batch},
+            WORKLOAD_MAX_BATCH,
+        )
+    except WorkloadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def apply(state: Dict[str, Any]):
+        state["workload"] = workload.to_spec()
+        state["workload_version"] += 1
+
+    control.update(apply)
+    return {"status": "updated", **workload.describe()}
+
+
+@app.get("/workload")
+def get_workload():
+    workload = current_workload(control.snapshot())
+    if workload is None:
+        return {"status": "none"}
+    return {"status": "active", **workload.describe()}
 
 @app.post("/start_run")
 async def start_run(
@@ -679,13 +1110,10 @@ async def start_run(
     - kill any existing PBFT processes
     - start a fresh run 
     """
-    global current_request, current_replica_count, control_epoch, faulty_replicas
-
-    # 1) Normalize and store the message
+    # 1) Normalize the message
     msg = message.strip()
     if not msg:
         msg = "Default Request"
-    current_request = msg
 
     # 2) Sanitize rounds
     try:
@@ -695,10 +1123,14 @@ async def start_run(
     if r < 1:
         r = 1
 
-    # 3) Sync replica count with any /num_replicas changes and reset control state
-    current_replica_count = REPLICA_COUNT
-    control_epoch = (control_epoch + 1) if control_epoch >= 0 else 0
-    last_round_events.clear()
+    # 3) Store the message, sync replica count with any /num_replicas changes and reset control state
+    def apply(state: Dict[str, Any]):
+        state["current_request"] = msg
+        state["current_replica_count"] = state["replica_count"]
+        state["control_epoch"] = bump_epoch(state["control_epoch"])
+        state["last_round_events"] = []
+
+    snap = control.update(apply)
 
     # 4) Kill any existing PBFT processes
     subprocess.run(["bash", "../scripts/kill_pbft.sh"], check=False)
@@ -712,8 +1144,8 @@ async def start_run(
     return {
         "status": "started",
         "rounds": r,
-        "message": current_request,
-        "num_replicas": current_replica_count,
+        "message": snap.current_request,
+        "num_replicas": snap.current_replica_count,
     }
 
 @app.post("/reset_run")
@@ -721,18 +1153,18 @@ async def reset_run():
     """
     Kill any existing PBFT processes without starting a new run.
     """
-    global current_request, control_epoch, last_round_events, faulty_replicas, current_replica_count
-
     # Kill any existing PBFT processes
     subprocess.run(["bash", "../scripts/kill_pbft.sh"], check=False)
 
-    current_request = "Empty Request"
-    current_replica_count = REPLICA_COUNT
-    last_round_events.clear()
-    faulty_replicas.clear()
-    control_epoch = (control_epoch + 1) if control_epoch >= 0 else 0
+    def apply(state: Dict[str, Any]):
+        state["current_request"] = "Empty Request"
+        state["current_replica_count"] = state["replica_count"]
+        state["last_round_events"] = []
+        state["faulty_replicas"].clear()
+        state["control_epoch"] = bump_epoch(state["control_epoch"])
 
-    return {"status": "reset", "message": current_request}
+    snap = control.update(apply)
+    return {"status": "reset", "message": snap.current_request}
 
 
 def _parse_ids(ids: str) -> Set[int]:
@@ -758,35 +1190,40 @@ async def faulty_update(ids: str = Form(""), action: str = Form("add")):
     Update the set of faulty replicas and broadcast via control events.
     action in {add, remove, set}
     """
-    global faulty_replicas, control_epoch
-
     requested = _parse_ids(ids)
     if not requested:
+        faulty = control.snapshot().faulty_replicas
         return {
             "status": "noop",
-            "faulty_ids": sorted(faulty_replicas),
-            "count": len(faulty_replicas),
+            "faulty_ids": sorted(faulty),
+            "count": len(faulty),
         }
 
-    before = set(faulty_replicas)
     action_lc = (action or "").strip().lower()
-    if action_lc == "set":
-        faulty_replicas.clear()
-        faulty_replicas.update(requested)
-    elif action_lc == "remove":
-        for rid in requested:
-            faulty_replicas.discard(rid)
-    else:  # default to add
-        faulty_replicas.update(requested)
-
-    changed = faulty_replicas != before
-    if changed:
-        control_epoch = (control_epoch + 1) if control_epoch >= 0 else 0
-
+    changed = False
+
+    def apply(state: Dict[str, Any]):
+        nonlocal changed
+        faulty_replicas: Set[int] = state["faulty_replicas"]
+        before = set(faulty_replicas)
+        if action_lc == "set":
+            faulty_replicas.clear()
+            faulty_replicas.update(requested)
+        elif action_lc == "remove":
+            for rid in requested:
+                faulty_replicas.discard(rid)
+        else:  # default to add
+            faulty_replicas.update(requested)
+
+        changed = faulty_replicas != before
+        if changed:
+            state["control_epoch"] = bump_epoch(state["control_epoch"])
+
+    snap = control.update(apply)
     return {
         "status": "updated" if changed else "unchanged",
-        "faulty_ids": sorted(faulty_replicas),
-        "count": len(faulty_replicas),
+        "faulty_ids": sorted(snap.faulty_replicas),
+        "count": len(snap.faulty_replicas),
     }
 
 @app.post("/num_replicas")
@@ -794,8 +1231,6 @@ async def set_num_replicas(num_replicas: int = Form(4)):
     """
     Manage the number of PBFT replicas independently of start_run.
     """
-    global REPLICA_COUNT, current_replica_count, control_epoch, last_round_events, faulty_replicas
-
     # Sanitize input
     try:
         new_count = int(num_replicas)
@@ -807,17 +1242,20 @@ async def set_num_replicas(num_replicas: int = Form(4)):
         new_count = 10
 
     # If nothing changed, don't do a full reset
-    if new_count == REPLICA_COUNT:
-        return {"status": "unchanged", "num_replicas": REPLICA_COUNT}
+    if new_count == control.snapshot().replica_count:
+        return {"status": "unchanged", "num_replicas": new_count}
 
     # Kill any existing PBFT processes
     subprocess.run(["bash", "../scripts/kill_pbft.sh"], check=False)
-    
-    REPLICA_COUNT = new_count
-    current_replica_count = new_count
-    control_epoch = (control_epoch + 1) if control_epoch >= 0 else 0
-    last_round_events.clear()
-    faulty_replicas.clear()
+
+    def apply(state: Dict[str, Any]):
+        state["replica_count"] = new_count
+        state["current_replica_count"] = new_count
+        state["control_epoch"] = bump_epoch(state["control_epoch"])
+        state["last_round_events"] = []
+        state["faulty_replicas"].clear()
+
+    control.update(apply)
 
     # Trigger PBFT reconfiguration (kill + regen configs + recopy)
     try:
@@ -830,4 +1268,4 @@ async def set_num_replicas(num_replicas: int = Form(4)):
         # We still return the new replica count, but indicate an error
         status = f"error: {e!r}"
 
-    return {"status": status, "num_replicas": REPLICA_COUNT}
+    return {"status": status, "num_replicas": new_count}
@@ -0,0 +1,116 @@
+# Server-side /stream subscription filters
+# - a FilterSpec is parsed from the query once per subscription; values that
+#   would silently match everything or nothing raise FilterError (400)
+# - compile_filter turns it into a predicate over envelope dicts; compiled
+#   predicates are cached by spec, so identical subscriptions share one
+# - predicates run before an event is stamped and serialized
+
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Set
+
+EventPredicate = Callable[[Dict[str, Any], FrozenSet[int]], bool]
+
+
+class FilterError(ValueError):
+    pass
+
+
+class FilterSpec(NamedTuple):
+    types: Optional[FrozenSet[str]]  # lower-cased event type names
+    from_ids: Optional[FrozenSet[int]]
+    to_ids: Optional[FrozenSet[int]]
+    seq_min: Optional[int]
+    seq_max: Optional[int]
+    view_min: Optional[int]
+    view_max: Optional[int]
+    only_faulty: bool
+
+    @classmethod
+    def build(
+        cls,
+        types: Optional[str] = None,
+        from_ids: Optional[Set[int]] = None,
+        to_ids: Optional[Set[int]] = None,
+        seq_min: Optional[int] = None,
+        seq_max: Optional[int] = None,
+        view_min: Optional[int] = None,
+        view_max: Optional[int] = None,
+        only_faulty: bool = False,
+        known_types: Optional[FrozenSet[str]] = None,
+    ) -> Optional["FilterSpec"]:
+        """
+        Return a spec, or None when nothing would be filtered. An id list given
+        but empty, a type outside `known_types` (lower-cased) or an inverted
+        range raises FilterError.
+        """
+        type_set = None
+        if isinstance(types, str):
+            type_set = frozenset(t.strip().lower() for t in types.split(",") if t.strip()) or None
+            if type_set and known_types is not None and not type_set <= known_types:
+                raise FilterError(f"unknown event types: {', '.join(sorted(type_set - known_types))}")
+        for name, ids in (("from_ids", from_ids), ("to_ids", to_ids)):
+            if ids is not None and not ids:
+                raise FilterError(f"{name} has no valid replica ids")
+        for name, lo, hi in (("seq", seq_min, seq_max), ("view", view_min, view_max)):
+            if lo is not None and hi is not None and lo > hi:
+                raise FilterError(f"{name}_min {lo} is greater than {name}_max {hi}")
+        spec = cls(
+            types=type_set,
+            from_ids=frozenset(from_ids) if from_ids else None,
+            to_ids=frozenset(to_ids) if to_ids else None,
+            seq_min=seq_min,
+            seq_max=seq_max,
+            view_min=view_min,
+            view_max=view_max,
+            only_faulty=bool(only_faulty),
+        )
+        if spec == cls(None, None, None, None, None, None, None, False):
+            return None
+        return spec
+
+
+def _in_range(key: str, lo: Optional[int], hi: Optional[int]) -> EventPredicate:
+    lo_val = lo if lo is not None else float("-inf")
+    hi_val = hi if hi is not None else float("inf")
+
+    def check(ev: Dict[str, Any], faulty: FrozenSet[int]) -> bool:
+        val = ev.get(key)
+        return isinstance(val, int) and lo_val <= val <= hi_val
+
+    return check
+
+
+@lru_cache(maxsize=256)
+def compile_filter(spec: FilterSpec) -> EventPredicate:
+    """
+    Build predicate(envelope, faulty_ids) -> bool. Every clause in the spec
+    must hold; faulty_ids is passed per call since it changes with the epoch.
+    """
+    checks: List[EventPredicate] = []
+
+    if spec.types is not None:
+        types = spec.types
+        checks.append(lambda ev, faulty: str(ev.get("type", "")).lower() in types)
+    if spec.from_ids is not None:
+        from_ids = spec.from_ids
+        checks.append(lambda ev, faulty: ev.get("from") in from_ids)
+    if spec.to_ids is not None:
+        to_ids = spec.to_ids
+        checks.append(lambda ev, faulty: not to_ids.isdisjoint(ev.get("to") or ()))
+    if spec.seq_min is not None or spec.seq_max is not None:
+        checks.append(_in_range("seq", spec.seq_min, spec.seq_max))
+    if spec.view_min is not None or spec.view_max is not None:
+        checks.append(_in_range("view", spec.view_min, spec.view_max))
+    if spec.only_faulty:
+        checks.append(lambda ev, faulty: ev.get("from") in faulty or not faulty.isdisjoint(ev.get("to") or ()))
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def predicate(ev: Dict[str, Any], faulty: FrozenSet[int]) -> bool:
+        for check in checks:
+            if not check(ev, faulty):
+                return False
+        return True
+
+    return predicate
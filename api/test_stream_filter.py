@@ -0,0 +1,57 @@
+import pytest
+
+from stream_filter import FilterError, FilterSpec, compile_filter
+
+KNOWN = frozenset({"prepare", "commit", "sessionstart"})
+
+
+def event(type_="Prepare", from_=1, to=(2,), seq=5, view=0):
+    return {"type": type_, "from": from_, "to": list(to), "seq": seq, "view": view}
+
+
+def test_no_filter_builds_no_spec():
+    assert FilterSpec.build() is None
+    assert FilterSpec.build(types=" , ") is None
+
+
+def test_clauses_are_combined_with_and():
+    accept = compile_filter(FilterSpec.build(types="prepare", from_ids={1}, seq_min=5, seq_max=6))
+    assert accept(event(), frozenset())
+    assert not accept(event(type_="Commit"), frozenset())
+    assert not accept(event(from_=2), frozenset())
+    assert not accept(event(seq=7), frozenset())
+    assert not accept(event(seq=None), frozenset())
+
+
+def test_type_match_ignores_case():
+    accept = compile_filter(FilterSpec.build(types="PREPARE", known_types=KNOWN))
+    assert accept(event(type_="Prepare"), frozenset())
+
+
+def test_to_ids_match_any_receiver():
+    accept = compile_filter(FilterSpec.build(to_ids={3}))
+    assert accept(event(to=(2, 3)), frozenset())
+    assert not accept(event(to=()), frozenset())
+
+
+def test_only_faulty_uses_faulty_set_per_call():
+    accept = compile_filter(FilterSpec.build(only_faulty=True))
+    assert accept(event(from_=1), frozenset({1}))
+    assert accept(event(to=(2,)), frozenset({2}))
+    assert not accept(event(), frozenset())
+
+
+def test_identical_specs_share_a_predicate():
+    assert compile_filter(FilterSpec.build(view_min=1)) is compile_filter(FilterSpec.build(view_min=1))
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"from_ids": set()},
+    {"to_ids": set()},
+    {"types": "Comit", "known_types": KNOWN},
+    {"seq_min": 5, "seq_max": 2},
+    {"view_min": 3, "view_max": 1},
+])
+def test_filters_that_would_fail_open_or_shut_are_rejected(kwargs):
+    with pytest.raises(FilterError):
+        FilterSpec.build(**kwargs)
@@ -0,0 +1,104 @@
+from vote_detector import VoteDetector
+
+N, F = 4, 1
+DEADLINE = 3.0
+
+
+def detector() -> VoteDetector:
+    return VoteDetector(N, F, DEADLINE, 512)
+
+
+def vote(det, phase, sender, digest="D", seq=1, view=0, now=0.0):
+    return det.observe(phase, view, seq, sender, digest, now)
+
+
+def types(events):
+    return [e.type for e in events]
+
+
+def test_honest_round_reaches_quorum_once_per_phase():
+    det = detector()
+    events = vote(det, "PrePrepare", 0)
+    for sender in (1, 2, 3):  # primary 0 sends no Prepare
+        events += vote(det, "Prepare", sender)
+    for sender in range(N):
+        events += vote(det, "Commit", sender)
+    events += det.expire(DEADLINE)
+
+    quorums = [e for e in events if e.type == "QuorumReached"]
+    assert [e.data["phase"] for e in quorums] == ["Prepare", "Commit"]
+    assert quorums[0].data["quorum"] == 2 * F
+    assert quorums[1].data["quorum"] == 2 * F + 1
+    assert "MissingVotes" not in types(events)
+    assert "Equivocation" not in types(events)
+
+
+def test_same_vote_seen_by_several_receivers_counts_once():
+    det = detector()
+    assert vote(det, "Commit", 1) == []
+    assert vote(det, "Commit", 1) == []
+    assert det.tallies[(0, 1, "Commit")].senders == 1 << 1
+
+
+def test_double_vote_blames_the_sender():
+    det = detector()
+    assert vote(det, "Prepare", 3, "BAD") == []
+    events = vote(det, "Prepare", 3, "GOOD")
+    assert types(events) == ["Equivocation"]
+    assert events[0].sender == 3
+    assert events[0].data["double_vote"] is True
+    assert events[0].data["conflicting"] == {"BAD": [3]}
+
+
+def test_split_vote_reports_minority_once_without_blaming_honest_senders():
+    det = detector()
+    events = vote(det, "Commit", 3, "BAD")
+    for sender in (1, 2, 0):
+        events += vote(det, "Commit", sender, "GOOD")
+    events += det.expire(DEADLINE)
+
+    conflicts = [e for e in events if e.type == "Equivocation"]
+    assert len(conflicts) == 1
+    assert conflicts[0].sender == -1
+    assert conflicts[0].data["double_vote"] is False
+    assert conflicts[0].data["digest"] == "GOOD"
+    assert conflicts[0].data["minority"] == [3]
+
+
+def test_tie_without_quorum_names_no_minority():
+    det = detector()
+    vote(det, "Commit", 1, "A")
+    vote(det, "Commit", 2, "B")
+    conflicts = [e for e in det.expire(DEADLINE) if e.type == "Equivocation"]
+    assert len(conflicts) == 1
+    assert conflicts[0].data["digest"] is None
+    assert conflicts[0].data["minority"] == []
+    assert conflicts[0].data["conflicting"] == {"A": [1], "B": [2]}
+
+
+def test_silent_replica_is_reported_missing_once():
+    det = detector()
+    for sender in (0, 1, 2):
+        vote(det, "Commit", sender)
+    assert det.expire(DEADLINE - 0.1) == []
+    missing = det.expire(DEADLINE)
+    assert types(missing) == ["MissingVotes"]
+    assert missing[0].data["missing"] == [3]
+    assert missing[0].data["quorum_reached"] is True
+    assert det.expire(DEADLINE + 0.5) == []
+
+
+def test_late_vote_after_key_dropped_is_ignored():
+    det = detector()
+    for sender in (1, 2):
+        vote(det, "Prepare", sender)
+    det.expire(DEADLINE)
+    det.expire(2 * DEADLINE)
+    assert (0, 1, "Prepare") not in det.tallies
+
+    assert vote(det, "Prepare", 1, now=2 * DEADLINE + 1) == []
+    assert vote(det, "Prepare", 3, now=2 * DEADLINE + 1) == []
+    assert det.expire(4 * DEADLINE) == []
+    # A later sequence number is still tracked
+    vote(det, "Prepare", 1, seq=2, now=2 * DEADLINE + 1)
+    assert (0, 2, "Prepare") in det.tallies
@@ -0,0 +1,61 @@
+import pytest
+
+from workload import TokenBucket, Workload, WorkloadError
+
+
+def test_bucket_grants_burst_then_waits_for_refill():
+    bucket = TokenBucket(rate=10.0, burst=5.0, now=0.0)
+    assert bucket.reserve(5, 0.0, max_wait=1.0) == (True, 0.0)
+    granted, wait = bucket.reserve(2, 0.0, max_wait=1.0)
+    assert granted and wait == pytest.approx(0.2)
+    # Refilled for 0.5s after going 2 tokens into debt: 3 tokens
+    granted, wait = bucket.reserve(5, 0.5, max_wait=1.0)
+    assert granted and wait == pytest.approx(0.2)
+
+
+def test_bucket_refusal_takes_nothing():
+    bucket = TokenBucket(rate=1.0, burst=2.0, now=0.0)
+    assert bucket.reserve(2, 0.0, max_wait=0.5) == (True, 0.0)
+    granted, wait = bucket.reserve(2, 0.0, max_wait=0.5)
+    assert not granted and wait == pytest.approx(2.0)
+    assert bucket.reserve(2, 2.0, max_wait=0.5) == (True, 0.0)
+
+
+def test_large_batch_is_always_eventually_granted():
+    workload = Workload(template="{rank}", rate=10.0, batch=100)
+    assert workload.burst >= 100
+    for now in (0.0, 10.0, 20.0):
+        assert workload.reserve(1, workload.batch_size(None), now, max_wait=5.0)[0]
+    assert workload.batch_size(500) == 100
+
+
+def test_batches_index_each_client_stream_by_next_rank():
+    workload = Workload.from_spec({"template": "{message}-c{cid}-r{rank}", "batch": 2})
+    assert workload.take(3, 0, 2, "m") == ["m-c3-r0", "m-c3-r1"]
+    assert workload.take(3, 2, 2, "m") == ["m-c3-r4", "m-c3-r5"]
+
+
+def test_per_client_payloads_fall_back_to_template():
+    workload = Workload.from_spec({"template": "t{cid}", "payloads": {"1": ["a", "b"]}})
+    assert workload.take(1, 0, 3, "") == ["a", "b", "a"]
+    assert workload.take(2, 0, 1, "") == ["t2"]
+
+
+def test_payloads_are_single_lines_and_json():
+    workload = Workload.from_spec({"payloads": [{"op": "put", "k": 1}, "a\nb"]})
+    assert workload.take(0, 0, 2, "") == ['{"op": "put", "k": 1}', "a b"]
+
+
+@pytest.mark.parametrize("template", ["{nope}", "{0}", "{cid.x}", "{rank[0]}", "{"])
+def test_bad_template_is_rejected(template):
+    with pytest.raises(WorkloadError):
+        Workload(template=template)
+
+
+def test_bad_spec_is_rejected():
+    with pytest.raises(WorkloadError):
+        Workload.from_spec({})
+    with pytest.raises(WorkloadError):
+        Workload.from_spec({"payloads": {"x": ["a"]}})
+    with pytest.raises(WorkloadError):
+        Workload.from_spec({"payloads": {"1": []}})
@@ -0,0 +1,203 @@
+# Streaming quorum / equivocation detector for PBFT votes
+# - tracks senders and digests per (view, seq, phase) as integer bitsets
+# - reports QuorumReached, MissingVotes and Equivocation as votes arrive
+# - memory is bounded by the in-flight window of (view, seq, phase) keys
+
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+VOTE_PHASES = ("PrePrepare", "Prepare", "Commit")
+DETECTOR_EVENT_TYPES = ("QuorumReached", "MissingVotes", "Equivocation")
+
+
+class DetectorEvent(NamedTuple):
+    type: str  # one of DETECTOR_EVENT_TYPES
+    view: int
+    seq: int
+    sender: int  # replica that voted two ways for a double vote, otherwise -1
+    data: Dict
+
+
+def bits_to_ids(bits: int) -> List[int]:
+    ids: List[int] = []
+    idx = 0
+    while bits:
+        if bits & 1:
+            ids.append(idx)
+        bits >>= 1
+        idx += 1
+    return ids
+
+
+class VoteTally:
+    __slots__ = ("first_seen", "senders", "digests", "quorum_reached", "conflict_reported", "closed")
+
+    def __init__(self, now: float):
+        self.first_seen = now
+        self.senders = 0
+        # digest (None when the vote carried none) -> bitset of senders
+        self.digests: Dict[Optional[str], int] = {}
+        self.quorum_reached = False
+        self.conflict_reported = False
+        self.closed = False
+
+
+class VoteDetector:
+    """
+    Incremental vote checker for one stream.
+
+    Prepare expects every backup (all replicas but the primary, view % n) and
+    reaches quorum at 2f matching digests; Commit expects every replica and
+    reaches quorum at 2f+1. PrePrepare is only checked for equivocation.
+    A replica voting for two digests is reported as a double vote right away.
+    Honest replicas disagreeing with others give one conflict report per key,
+    naming the minority senders, once quorum decides the majority (or at the
+    deadline if it never does).
+    A key is reported as MissingVotes once, `deadline` seconds after its first
+    vote, and dropped after twice that. At most `window` keys are kept; votes
+    for a (view, seq) at or below the last one dropped in that phase are
+    ignored, so a late vote cannot reopen a key and report it missing again.
+    """
+
+    def __init__(self, n: int, f: int, deadline: float, window: int, faulty: Iterable[int] = ()):
+        self.deadline = max(0.1, deadline)
+        self.window = max(1, window)
+        self.tallies: "OrderedDict[Tuple[int, int, str], VoteTally]" = OrderedDict()
+        # phase -> highest (view, seq) dropped from tallies
+        self.dropped: Dict[str, Tuple[int, int]] = {}
+        self.reset(n, f, faulty)
+
+    def reset(self, n: int, f: int, faulty: Iterable[int] = ()):
+        self.n = max(1, n)
+        self.f = max(0, f)
+        self.faulty = frozenset(faulty)
+        self.tallies.clear()
+        self.dropped.clear()
+
+    def quorum(self, phase: str) -> int:
+        if phase == "Prepare":
+            return max(1, 2 * self.f)
+        return 2 * self.f + 1
+
+    def expected(self, phase: str, view: int) -> int:
+        everyone = (1 << self.n) - 1
+        if phase == "Prepare":
+            return everyone & ~(1 << (view % self.n))
+        return everyone
+
+    def observe(self, phase: str, view: int, seq: Optional[int], sender: Optional[int],
+                digest: Optional[str], now: float) -> List[DetectorEvent]:
+        if phase not in VOTE_PHASES or not isinstance(seq, int):
+            return []
+        if not isinstance(sender, int) or sender < 0:
+            return []
+
+        key = (view, seq, phase)
+        tally = self.tallies.get(key)
+        if tally is None:
+            mark = self.dropped.get(phase)
+            if mark is not None and (view, seq) <= mark:
+                return []
+            if len(self.tallies) >= self.window:
+                self._drop(next(iter(self.tallies)))
+            tally = self.tallies[key] = VoteTally(now)
+
+        bit = 1 << sender
+        out: List[DetectorEvent] = []
+        same = tally.digests.get(digest, 0)
+        if same & bit:
+            return out  # same vote logged again by another receiver
+
+        if digest is not None and tally.senders & bit:
+            own = [d for d, bits in tally.digests.items() if d is not None and d != digest and bits & bit]
+            if own:
+                out.append(DetectorEvent("Equivocation", view, seq, sender, {
+                    "phase": phase,
+                    "sender": sender,
+                    "digest": digest,
+                    "double_vote": True,
+                    "conflicting": {d: bits_to_ids(tally.digests[d]) for d in own},
+                }))
+        tally.digests[digest] = same | bit
+        tally.senders |= bit
+
+        if phase != "PrePrepare" and not tally.quorum_reached:
+            q = self.quorum(phase)
+            matching = tally.digests[digest]
+            if matching.bit_count() >= q:
+                tally.quorum_reached = True
+                out.append(DetectorEvent("QuorumReached", view, seq, -1, {
+                    "phase": phase,
+                    "digest": digest,
+                    "quorum": q,
+                    "senders": bits_to_ids(matching),
+                    "elapsed_ms": round((now - tally.first_seen) * 1000.0, 3),
+                }))
+        if tally.quorum_reached:
+            self._report_conflict(view, seq, phase, tally, out)
+        return out
+
+    def _report_conflict(self, view: int, seq: int, phase: str, tally: VoteTally, out: List[DetectorEvent]):
+        """Append one Equivocation per key when senders split across digests."""
+        if tally.conflict_reported:
+            return
+        # Double voters were already reported; only count single-digest senders
+        seen = twice = 0
+        for d, bits in tally.digests.items():
+            if d is not None:
+                twice |= seen & bits
+                seen |= bits
+        digests = {d: bits & ~twice for d, bits in tally.digests.items() if d is not None and bits & ~twice}
+        if len(digests) < 2:
+            return
+        tally.conflict_reported = True
+        counts = sorted((bits.bit_count() for bits in digests.values()), reverse=True)
+        majority: Optional[str] = None
+        if counts[0] > counts[1]:
+            majority = max(digests, key=lambda d: digests[d].bit_count())
+        # Without a strict majority there is no side to blame
+        minority = 0
+        if majority is not None:
+            for d, bits in digests.items():
+                if d != majority:
+                    minority |= bits
+        out.append(DetectorEvent("Equivocation", view, seq, -1, {
+            "phase": phase,
+            "digest": majority,
+            "double_vote": False,
+            "conflicting": {d: bits_to_ids(bits) for d, bits in digests.items() if d != majority},
+            "minority": bits_to_ids(minority),
+        }))
+
+    def expire(self, now: float) -> List[DetectorEvent]:
+        out: List[DetectorEvent] = []
+        # Keys are in first-seen order, so stop at the first one still in its deadline.
+        for key, tally in list(self.tallies.items()):
+            age = now - tally.first_seen
+            if age < self.deadline:
+                break
+            view, seq, phase = key
+            if not tally.closed:
+                tally.closed = True
+                self._report_conflict(view, seq, phase, tally, out)
+                missing = self.expected(phase, view) & ~tally.senders if phase != "PrePrepare" else 0
+                if missing:
+                    missing_ids = bits_to_ids(missing)
+                    out.append(DetectorEvent("MissingVotes", view, seq, -1, {
+                        "phase": phase,
+                        "missing": missing_ids,
+                        "known_faulty": [rid for rid in missing_ids if rid in self.faulty],
+                        "received": bits_to_ids(tally.senders),
+                        "quorum_reached": tally.quorum_reached,
+                        "deadline_ms": round(self.deadline * 1000.0, 3),
+                    }))
+            if age >= self.deadline * 2:
+                self._drop(key)
+        return out
+
+    def _drop(self, key: Tuple[int, int, str]):
+        view, seq, phase = key
+        del self.tallies[key]
+        mark = self.dropped.get(phase)
+        if mark is None or (view, seq) > mark:
+            self.dropped[phase] = (view, seq)
@@ -0,0 +1,161 @@
+# Workload feed for /castest
+# - per-client request streams, either preloaded payload lists or a template
+# - next_rank indexes a client's stream directly (no per-client cursor)
+# - optional per-client token bucket rate limit and batched responses
+#
+# wandlr pipes each /castest response into the PBFT client line by line, so a
+# batch is returned as newline-separated payloads.
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class WorkloadError(ValueError):
+    pass
+
+
+def _clean_payload(value: Any) -> str:
+    # One request per line: embedded newlines would split a payload in two
+    # Non-string items are sent as the JSON the operator posted, not a Python repr
+    text = value if isinstance(value, str) else json.dumps(value)
+    return text.replace("\r", " ").replace("\n", " ")
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def reserve(self, count: int, now: float, max_wait: float) -> Tuple[bool, float]:
+        """
+        Take `count` tokens, possibly going into debt.
+        Returns (granted, wait): how long the caller must wait before using
+        them, with nothing taken if that would exceed `max_wait`.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        remaining = self.tokens - count
+        wait = -remaining / self.rate if remaining < 0 else 0.0
+        if wait > max_wait:
+            return False, wait
+        self.tokens = remaining
+        return True, wait
+
+
+class Workload:
+    """
+    Request streams for every client.
+
+    Payload `i` of client `cid` comes from, in order of preference:
+    payloads[cid][i % len], shared[i % len], or template.format(cid, rank=i,
+    message). Response `next_rank` of a batch of size b covers payloads
+    next_rank*b .. next_rank*b + b - 1, so next_rank keeps counting calls.
+    """
+
+    def __init__(
+        self,
+        template: str = "",
+        payloads: Optional[Dict[int, List[str]]] = None,
+        shared: Optional[List[str]] = None,
+        rate: float = 0.0,
+        burst: float = 0.0,
+        batch: int = 1,
+        max_batch: int = 1000,
+    ):
+        self.template = template
+        self.payloads = payloads or {}
+        self.shared = shared or []
+        self.rate = max(0.0, rate)
+        self.max_batch = max(1, max_batch)
+        self.batch = min(max(1, batch), self.max_batch)
+        # A bucket never holds more than `burst`, so a bigger batch could never be granted
+        self.burst = max(1.0, burst or self.rate, float(self.batch))
+        self.buckets: Dict[int, TokenBucket] = {}
+
+        if not (self.template or self.payloads or self.shared):
+            raise WorkloadError("workload needs a template or payloads")
+        if self.template:
+            try:
+                self.template.format(cid=0, rank=0, message="")
+            except Exception as e:  # KeyError, AttributeError ({cid.x}), TypeError ({rank[0]}), ...
+                raise WorkloadError(f"bad template: {e!r}")
+
+    @classmethod
+    def from_spec(cls, spec: Dict[str, Any], max_batch: int = 1000) -> "Workload":
+        raw = spec.get("payloads")
+        payloads: Dict[int, List[str]] = {}
+        shared: List[str] = []
+        if isinstance(raw, list):
+            shared = [_clean_payload(p) for p in raw]
+        elif isinstance(raw, dict):
+            for cid, items in raw.items():
+                try:
+                    cid_val = int(cid)
+                except (TypeError, ValueError):
+                    raise WorkloadError(f"bad client id: {cid!r}")
+                if not isinstance(items, list) or not items:
+                    raise WorkloadError(f"payloads for client {cid_val} must be a non-empty list")
+                payloads[cid_val] = [_clean_payload(p) for p in items]
+        elif raw is not None:
+            raise WorkloadError("payloads must be a list or an object of lists")
+        return cls(
+            template=spec.get("template") or "",
+            payloads=payloads,
+            shared=shared,
+            rate=float(spec.get("rate") or 0.0),
+            burst=float(spec.get("burst") or 0.0),
+            batch=int(spec.get("batch") or 1),
+            max_batch=max_batch,
+        )
+
+    def to_spec(self) -> Dict[str, Any]:
+        return {
+            "template": self.template,
+            "payloads": {str(cid): items for cid, items in self.payloads.items()} or self.shared or None,
+            "rate": self.rate,
+            "burst": self.burst,
+            "batch": self.batch,
+        }
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "template": self.template or None,
+            "clients": sorted(self.payloads),
+            "payload_counts": {str(cid): len(items) for cid, items in self.payloads.items()},
+            "shared_payloads": len(self.shared),
+            "rate": self.rate,
+            "burst": self.burst,
+            "batch": self.batch,
+        }
+
+    def payload(self, cid: int, index: int, message: str) -> str:
+        items = self.payloads.get(cid) or self.shared
+        if items:
+            return items[index % len(items)]
+        if self.template:
+            return _clean_payload(self.template.format(cid=cid, rank=index, message=message))
+        return _clean_payload(message)
+
+    def batch_size(self, requested: Optional[int]) -> int:
+        if requested is None or requested < 1:
+            return self.batch
+        if self.rate > 0:
+            return min(requested, self.max_batch, int(self.burst))
+        return min(requested, self.max_batch)
+
+    def take(self, cid: int, next_rank: int, batch: int, message: str) -> List[str]:
+        start = max(0, next_rank) * batch
+        return [self.payload(cid, i, message) for i in range(start, start + batch)]
+
+    def reserve(self, cid: int, count: int, now: float, max_wait: float) -> Tuple[bool, float]:
+        """(granted, seconds to wait) before answering `cid` with `count` payloads."""
+        if self.rate <= 0:
+            return True, 0.0
+        bucket = self.buckets.get(cid)
+        if bucket is None:
+            bucket = self.buckets[cid] = TokenBucket(self.rate, self.burst, now)
+        return bucket.reserve(count, now, max_wait)
@@ -14,10 +14,13 @@ import {
   MessageMarker,
 } from './hooks/useCanvasRenderer'
 import { initialState, reducer } from './state'
-import type { Envelope, LayoutMode } from './types'
+import type { Envelope, EventType, LayoutMode } from './types'
 
 type DemoStage = 'client' | 'pp' | 'prep' | 'commit' | 'reply'
 
+// Vote detector reports draw nothing, so they are logged but never take a playback step
+const DETECTOR_TYPES = new Set<EventType>(['QuorumReached', 'MissingVotes', 'Equivocation'])
+
 type Snapshot = {
   state: typeof initialState
   simTime: number
@@ -89,7 +92,9 @@ export default function App() {
     if (dropEventsRef.current && env.type === 'SessionStart') {
       dropEventsRef.current = false
     }
-    liveQueueRef.current.push(env)
+    if (!DETECTOR_TYPES.has(env.type)) {
+      liveQueueRef.current.push(env)
+    }
     sseLogRef.current.push(env)
     setSseLogCount((c) => c + 1)
   }, [])
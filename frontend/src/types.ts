@@ -8,6 +8,9 @@ export type EventType =
   | 'SessionStart'
   | 'PrimaryElected'
   | 'FaultyReplicas'
+  | 'QuorumReached'
+  | 'MissingVotes'
+  | 'Equivocation'
 
 export type Envelope = {
   schema_ver: number